@@ -7,9 +7,17 @@ Integrates YOLO object detection + TimeSformer temporal analysis with fusion eng
 import os
 import io
 import asyncio
+import fcntl
+import hashlib
 import logging
+import multiprocessing
+import shutil
+import subprocess
+import threading
 import time
-from typing import Dict, List, Optional, Any
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable, Iterator, Set, Tuple, Union
 import cv2
 import numpy as np
 from PIL import Image
@@ -17,25 +25,55 @@ import tempfile
 import base64
 from pathlib import Path
 
+try:
+    import av  # Optional: in-process libav decode, faster than cv2.VideoCapture
+except ImportError:
+    av = None
+
+try:
+    import pybase64 as b64codec  # Optional: SIMD base64, drop-in for the stdlib module
+except ImportError:
+    b64codec = base64
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB  # Optional: libjpeg-turbo SIMD JPEG encode
+    turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # Module or native library missing
+    turbo_jpeg = None
+
+try:
+    import orjson  # Optional: faster JSON responses with native numpy support
+except ImportError:
+    orjson = None
+
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 # Import our enhanced AI models
 from models.yolo import YOLODetector
 from models.timesformer import TimeSformerDetector  
-from models.fusion import FusionEngine
+from models.fusion import FusionEngine, PRIORITY_LEVELS, SEVERITY_LEVELS
+from models.video import WORKER_THREADS, open_video_capture, sample_frame_indices
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, serializing numpy arrays and scalars natively"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
 # Enhanced AI Configuration
 app = FastAPI(
     title="Enhanced Surveillance AI Microservice",
     description="Multi-modal anomaly detection with YOLO + TimeSformer fusion for production surveillance",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse
 )
 
 # CORS middleware for Node.js backend integration
@@ -65,6 +103,18 @@ class PredictionResponse(BaseModel):
     model_used: str = Field(..., description="AI model identifier")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Additional metadata")
     bounding_boxes: List[Dict] = Field(default_factory=list, description="Object detection bounding boxes")
+    
+    @field_validator("severity", mode="before")
+    @classmethod
+    def severity_label(cls, value: Any) -> Any:
+        """Fusion keeps severity as an int code until the response is built"""
+        return SEVERITY_LEVELS[value] if isinstance(value, (int, np.integer)) else value
+    
+    @field_validator("priority", mode="before")
+    @classmethod
+    def priority_label(cls, value: Any) -> Any:
+        """Fusion keeps priority as an int code until the response is built"""
+        return PRIORITY_LEVELS[value] if isinstance(value, (int, np.integer)) else value
 
 class AnnotatedImageResponse(BaseModel):
     success: bool = Field(..., description="Whether annotation was successful")
@@ -78,18 +128,155 @@ class HealthResponse(BaseModel):
     uptime_seconds: float = Field(..., description="Service uptime in seconds")
     version: str = Field(..., description="Service version")
 
+class BatchCollector:
+    """
+    Micro-batcher: coalesces requests that arrive within a short window into a
+    single batched model call on a dedicated executor. Each caller awaits a
+    future that resolves to its own slice of the batched output.
+
+    Batches reach the model one at a time: the model is not thread-safe, so a
+    lock is held around each call while the next window keeps collecting.
+    """
+    
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], executor: ThreadPoolExecutor,
+                 max_batch_size: int = 8, max_wait_ms: float = 20.0):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+        self._model_lock = asyncio.Lock()
+    
+    def start(self):
+        """Start collecting on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._collect())
+    
+    async def stop(self):
+        """Stop collecting; batches already dispatched finish, requests still queued are cancelled"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue one item for the next batch and wait for its result"""
+        if self._task is None:
+            raise RuntimeError("BatchCollector is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+    
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Dispatch without waiting so the next window fills while this batch runs;
+            # the model lock keeps one batch at a time on the model. The task is
+            # held until done so it is not garbage collected mid-flight
+            task = loop.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        try:
+            async with self._model_lock:
+                results = await asyncio.get_running_loop().run_in_executor(self.executor, self.batch_fn, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
 # Enhanced Global Model Management
 model_cache = {}
 start_time = time.time()
 
 # Initialize AI models
-yolo_detector = YOLODetector()
-timesformer_detector = TimeSformerDetector()
+yolo_detector = YOLODetector(os.getenv("AI_YOLO_WEIGHTS", "yolov8n.pt"))
+timesformer_detector = TimeSformerDetector(weights_path=os.getenv("AI_TIMESFORMER_WEIGHTS"))
 fusion_engine = FusionEngine()
 
 # Model loading status
 models_loaded = {"yolo": False, "timesformer": False, "fusion": True}
 
+# Run both detectors at INT8 (YOLO calibrated over representative frames),
+# falling back to FP16 when disabled
+INT8 = os.getenv("AI_INT8", "1") == "1"
+INT8_CALIB_DIR = os.getenv("AI_INT8_CALIB_DIR")
+
+# Sampled frames the decoder may run ahead of the pipeline
+PREFETCH_FRAMES = 8
+
+# Above this many frames per sample, seeking beats grabbing through the gaps
+SPARSE_SEEK_RATIO = 50
+
+# Above this many frames per sample, hand each target to its own ffmpeg process
+# with an input-side -ss keyframe seek, all running concurrently
+FFMPEG_SEEK_RATIO = int(os.getenv("AI_FFMPEG_SEEK_RATIO", "1000"))
+FFMPEG_BIN = shutil.which("ffmpeg")
+
+# Long-lived worker pools for the detection pipeline, shared across requests.
+# Each model gets its own single-thread pool: the models are not thread-safe,
+# and a shared pool lets concurrent requests pile onto the same model.
+decode_executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="decode")
+yolo_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo")
+timesformer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="timesformer")
+
+# YOLO requests arriving within the batching window share one forward pass
+yolo_batcher = BatchCollector(
+    yolo_detector.detect_objects_batch, yolo_executor,
+    max_batch_size=int(os.getenv("AI_YOLO_MAX_BATCH", "8")),
+    max_wait_ms=float(os.getenv("AI_BATCH_WINDOW_MS", "20"))
+)
+
+# Uploaded videos are staged in RAM-backed tmpfs when available (decoders need a path)
+UPLOAD_TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Annotated image JPEG quality (OpenCV's default, kept for unchanged output size)
+JPEG_QUALITY = 95
+
+# Model input geometry shared by YOLO and TimeSformer
+MODEL_INPUT_SIZE = (224, 224)
+
+# On-disk cache of sampled video frames, keyed on upload content + sampling parameters
+FRAME_CACHE_ENABLED = os.getenv("AI_FRAME_CACHE", "1") == "1"
+FRAME_CACHE_DIR = Path(os.getenv("AI_FRAME_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ai_frame_cache")))
+FRAME_CACHE_MAX_BYTES = int(os.getenv("AI_FRAME_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Bumped whenever frame sampling changes, so entries sampled the old way miss
+FRAME_CACHE_VERSION = 2
+# Videos to pre-decode into the cache at startup (os.pathsep-separated); opt-in
+FRAME_CACHE_WARM_PATHS = [p for p in os.getenv("AI_FRAME_CACHE_WARM", "").split(os.pathsep) if p]
+
+# Background frame cache work, referenced until done: writes still pending (so
+# shutdown can wait for them) and the startup warmer
+pending_cache_writes: Set[asyncio.Future] = set()
+frame_cache_warmer: Optional[asyncio.Future] = None
+
 def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify API key for secure communication"""
     if not credentials or credentials.credentials != API_KEY:
@@ -101,14 +288,16 @@ def initialize_models():
     """Initialize all AI models for enhanced surveillance system"""
     global models_loaded
     
+    precision = "int8" if INT8 else "fp16"
+    
     try:
         # Load YOLO detector
         logger.info("Initializing YOLO detector...")
-        models_loaded["yolo"] = yolo_detector.load_model()
+        models_loaded["yolo"] = yolo_detector.load_model(precision=precision, calib_data_path=INT8_CALIB_DIR)
         
         # Load TimeSformer detector
         logger.info("Initializing TimeSformer detector...")
-        models_loaded["timesformer"] = timesformer_detector.load_model()
+        models_loaded["timesformer"] = timesformer_detector.load_model(precision=precision)
         
         logger.info(f"Models loaded: {models_loaded}")
         return all(models_loaded.values())
@@ -117,75 +306,518 @@ def initialize_models():
         logger.error(f"Failed to initialize models: {e}")
         return False
 
-def extract_video_frames(video_path: str, num_frames: int = 16) -> List[np.ndarray]:
+def iter_video_frames(video_path: str, num_frames: int = 16,
+                      target_size: Optional[Tuple[int, int]] = None,
+                      source_info: Optional[Dict[str, int]] = None) -> Iterator[np.ndarray]:
     """
-    Extract evenly spaced frames from video for TimeSformer processing
+    Yield evenly spaced RGB frames from video as they are decoded; a video no
+    longer than `num_frames` yields each of its frames once
+
+    Decodes in-process with PyAV (multi-threaded libavcodec) when it is installed
+    and the container reports its frame count, otherwise through OpenCV.
+
+    With `target_size` (width, height) each frame is downscaled as soon as it is
+    decoded, so only model-sized frames are ever held; the native resolution is
+    recorded in `source_info` for callers that report or rescale against it.
     """
-    cap = cv2.VideoCapture(video_path)
-    frames = []
+    yielded = 0
+    
+    container = None
+    if av is not None:
+        try:
+            container = av.open(video_path)
+        except av.FFmpegError as e:
+            logger.warning(f"PyAV could not open video, falling back to OpenCV: {e}")
+    
+    if container is not None and container.streams.video and container.streams.video[0].frames > 0:
+        frames = _iter_frames_pyav(container, num_frames)
+    else:
+        if container is not None:
+            container.close()
+        frames = _iter_frames_opencv(video_path, num_frames)
+    
+    for frame in frames:
+        if source_info is not None and not yielded:
+            source_info["width"], source_info["height"] = frame.shape[1], frame.shape[0]
+        if target_size is not None:
+            frame = cv2.resize(frame, target_size, interpolation=cv2.INTER_AREA)
+        yielded += 1
+        yield frame
+    
+    if yielded == 0:
+        raise ValueError("No frames could be extracted from video")
+
+def _iter_frames_pyav(container: "av.container.InputContainer", num_frames: int) -> Iterator[np.ndarray]:
+    """
+    Sample frames with PyAV, which decodes straight to RGB (no BGR->RGB pass).
+    Sparse sampling seeks the demuxer to the keyframe before each target
+    instead of decoding through the gaps.
+    """
+    try:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        stream.codec_context.thread_count = WORKER_THREADS
+        
+        total_frames = stream.frames
+        frame_indices = sample_frame_indices(total_frames, num_frames)
+        
+        if (FFMPEG_BIN and total_frames > num_frames * FFMPEG_SEEK_RATIO and stream.average_rate):
+            timestamps = frame_indices / float(stream.average_rate)
+            yield from _iter_frames_ffmpeg(container.name, timestamps, stream.width, stream.height)
+        elif total_frames > num_frames * SPARSE_SEEK_RATIO and stream.average_rate:
+            start_pts = stream.start_time or 0
+            for frame_idx in frame_indices:
+                target_pts = start_pts + int(frame_idx / stream.average_rate / stream.time_base)
+                container.seek(target_pts, stream=stream)
+                for frame in container.decode(stream):
+                    if frame.pts is None or frame.pts >= target_pts:
+                        yield frame.to_ndarray(format="rgb24")
+                        break
+                else:
+                    logger.warning(f"Failed to read frame at index {frame_idx}")
+        else:
+            wanted = set(frame_indices.tolist())
+            last_target = int(frame_indices[-1])
+            for frame_idx, frame in enumerate(container.decode(stream)):
+                if frame_idx > last_target:
+                    break
+                if frame_idx in wanted:
+                    yield frame.to_ndarray(format="rgb24")
+    
+    finally:
+        container.close()
+
+def _iter_frames_opencv(video_path: str, num_frames: int) -> Iterator[np.ndarray]:
+    """
+    Sample frames with OpenCV in a single forward pass: grab() advances the
+    stream without decoding pixels and retrieve() is only called on sampled
+    indices. Very sparse sampling of long videos falls back to seeking, where a
+    keyframe seek is cheaper than grabbing every frame in between.
+    """
+    cap = open_video_capture(video_path)
     
     try:
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if total_frames == 0:
+        if total_frames <= 0:
             raise ValueError("No frames found in video")
         
         # Calculate frame indices for even spacing
-        frame_indices = np.linspace(0, total_frames - 1, num_frames, dtype=int)
-        
-        for frame_idx in frame_indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            if ret:
-                # Convert BGR to RGB for model processing
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frames.append(frame_rgb)
-            else:
-                logger.warning(f"Failed to read frame at index {frame_idx}")
+        frame_indices = sample_frame_indices(total_frames, num_frames)
         
-        if len(frames) == 0:
-            raise ValueError("No frames could be extracted from video")
+        # One BGR buffer is decoded into for every frame; cvtColor hands each
+        # caller a fresh RGB array, so the buffer never escapes
+        bgr = None
         
-        # Pad with last frame if we didn't get enough frames
-        while len(frames) < num_frames:
-            frames.append(frames[-1])
-            
-        return frames[:num_frames]
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if FFMPEG_BIN and total_frames > num_frames * FFMPEG_SEEK_RATIO and fps > 0:
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            yield from _iter_frames_ffmpeg(video_path, frame_indices / fps, width, height)
+        elif total_frames > num_frames * SPARSE_SEEK_RATIO:
+            for frame_idx in frame_indices:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+                ret, frame = cap.read(bgr)
+                if ret:
+                    bgr = frame
+                    # Convert BGR to RGB for model processing
+                    yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                else:
+                    logger.warning(f"Failed to read frame at index {frame_idx}")
+        else:
+            wanted = set(frame_indices.tolist())
+            last_target = int(frame_indices[-1])
+            for frame_idx in range(last_target + 1):
+                if not cap.grab():
+                    logger.warning(f"Video stream ended early at frame {frame_idx}")
+                    break
+                if frame_idx not in wanted:
+                    continue
+                ret, frame = cap.retrieve(bgr)
+                if ret:
+                    bgr = frame
+                    # Convert BGR to RGB for model processing
+                    yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                else:
+                    logger.warning(f"Failed to read frame at index {frame_idx}")
     
     finally:
         cap.release()
 
-def process_multimodal_detection(frames: List[np.ndarray], is_video: bool = True) -> Dict[str, Any]:
+def _iter_frames_ffmpeg(video_path: str, timestamps: np.ndarray, width: int, height: int) -> Iterator[np.ndarray]:
+    """
+    Sample one frame per timestamp, each from its own ffmpeg process
+
+    `-ss` before `-i` seeks the demuxer to the nearest keyframe instead of
+    decoding up to the target, so cost scales with the number of samples rather
+    than the length of the video. All processes are started up front and decode
+    concurrently; frames are read back in order as raw RGB.
+    """
+    frame_bytes = width * height * 3
+    procs = [
+        subprocess.Popen(
+            [FFMPEG_BIN, '-nostdin', '-loglevel', 'error', '-threads', '2',
+             '-noautorotate', '-ss', f'{t:.3f}', '-i', video_path,
+             '-frames:v', '1', '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=1 << 20
+        )
+        for t in timestamps
+    ]
+    try:
+        for t, proc in zip(timestamps, procs):
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            n_read = proc.stdout.readinto(memoryview(frame).cast('B'))
+            proc.wait()
+            if n_read == frame_bytes:
+                yield frame
+            else:
+                logger.warning(f"ffmpeg failed to read frame at {t:.3f}s")
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+def extract_video_frames(video_path: str, num_frames: int = 16,
+                         target_size: Optional[Tuple[int, int]] = None) -> List[np.ndarray]:
+    """
+    Extract evenly spaced frames from video for TimeSformer processing
+    """
+    frames = list(iter_video_frames(video_path, num_frames, target_size))
+    
+    # Pad with last frame if we didn't get enough frames
+    while len(frames) < num_frames:
+        frames.append(frames[-1])
+        
+    return frames[:num_frames]
+
+async def stream_video_frames(video_path: str, num_frames: int = 16,
+                              target_size: Optional[Tuple[int, int]] = None,
+                              source_info: Optional[Dict[str, int]] = None) -> AsyncIterator[np.ndarray]:
+    """
+    Decode sampled frames on a worker thread and hand each one to the event loop
+    as soon as it is ready, so inference can start before decoding finishes
+
+    The decoder runs at most PREFETCH_FRAMES ahead: a full queue blocks it
+    until the pipeline catches up, bounding the frames held in flight.
+    """
+    loop = asyncio.get_running_loop()
+    frame_queue: asyncio.Queue = asyncio.Queue(maxsize=PREFETCH_FRAMES)
+    stop = threading.Event()
+    
+    def put(item: Optional[np.ndarray]) -> None:
+        asyncio.run_coroutine_threadsafe(frame_queue.put(item), loop).result()
+    
+    def produce():
+        frames = iter_video_frames(video_path, num_frames, target_size, source_info)
+        try:
+            for frame in frames:
+                if stop.is_set():
+                    break
+                put(frame)
+        finally:
+            frames.close()
+            put(None)
+    
+    producer = loop.run_in_executor(decode_executor, produce)
+    drained = False
+    try:
+        while (frame := await frame_queue.get()) is not None:
+            yield frame
+        drained = True
+    finally:
+        # If the consumer stops early, unblock and retire the decoder
+        stop.set()
+        while not drained:
+            drained = await frame_queue.get() is None
+    
+    # Surface decode errors once the stream is drained
+    await producer
+
+def save_upload_to_temp(file: UploadFile, suffix: str) -> Tuple[str, str]:
+    """
+    Copy an upload to a temp file in chunks, hashing as it goes
+
+    Returns the temp file path and the blake2b hex digest of the content.
+    """
+    digest = hashlib.blake2b()
+    file.file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=UPLOAD_TMP_DIR) as tmp_file:
+        for chunk in iter(lambda: file.file.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            tmp_file.write(chunk)
+    return tmp_file.name, digest.hexdigest()
+
+def decode_image(content: bytes) -> np.ndarray:
+    """
+    Decode uploaded image bytes to an RGB array without touching disk
+
+    The channel swap happens inside the decoder's own color conversion rather
+    than as a separate cvtColor pass over the decoded image.
+    """
+    image = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR_RGB) if content else None
+    if image is None:
+        raise ValueError("Could not read image file")
+    return image
+
+def encode_jpeg_b64(image_rgb: np.ndarray) -> str:
+    """
+    JPEG-encode an RGB image and return it base64 encoded
+
+    libjpeg-turbo takes RGB input directly, so the RGB->BGR conversion that
+    cv2.imencode needs is only done on the fallback path.
+    """
+    if turbo_jpeg is not None:
+        jpeg_bytes = turbo_jpeg.encode(image_rgb, quality=JPEG_QUALITY, pixel_format=TJPF_RGB)
+    else:
+        image_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+        _, jpeg_bytes = cv2.imencode('.jpg', image_bgr, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return b64codec.b64encode(jpeg_bytes).decode('ascii')
+
+def frame_cache_key(content_digest: str, num_frames: int, target_hw: Optional[Tuple[int, int]] = None) -> str:
+    """Cache key for a sampled clip: source content plus every sampling parameter"""
+    return hashlib.blake2b(f"v{FRAME_CACHE_VERSION}|{content_digest}|{num_frames}|{target_hw}".encode()).hexdigest()
+
+def load_cached_frames(cache_key: str) -> Optional[Tuple[np.ndarray, Dict[str, int]]]:
+    """
+    Load cached frames as a (T, H, W, 3) array plus the source resolution they
+    were sampled from, or None on a miss
+    """
+    cache_path = FRAME_CACHE_DIR / f"{cache_key}.npz"
+    if not cache_path.exists():
+        return None
+    try:
+        with np.load(cache_path) as entry:
+            frames = entry["frames"]
+            width, height = entry["source_size"].tolist()
+        # Touch so eviction is least-recently-used rather than oldest-written
+        os.utime(cache_path)
+        return frames, {"width": width, "height": height}
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        logger.warning(f"Discarding unreadable frame cache entry {cache_key}: {e}")
+        try:
+            cache_path.unlink(missing_ok=True)
+        except OSError:
+            pass
+        return None
+
+def store_cached_frames(cache_key: str, frames: List[np.ndarray], source_info: Dict[str, int]) -> None:
+    """Persist sampled frames and evict least-recently-used entries over the size cap"""
+    if not frames:
+        return
+    cache_path = FRAME_CACHE_DIR / f"{cache_key}.npz"
+    # Write then rename so concurrent readers never see a partial file
+    tmp_path = FRAME_CACHE_DIR / f"{cache_key}.{os.getpid()}.tmp"
+    try:
+        FRAME_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        source_size = np.array([source_info["width"], source_info["height"]], dtype=np.int64)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, frames=np.stack(frames), source_size=source_size)
+        os.replace(tmp_path, cache_path)
+        _evict_frame_cache()
+    except OSError as e:
+        logger.warning(f"Failed to store frame cache entry {cache_key}: {e}")
+        try:
+            tmp_path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+def _evict_frame_cache() -> None:
+    """Delete least-recently-used cache entries until the cache fits its size cap"""
+    entries = []
+    for path in FRAME_CACHE_DIR.glob("*.npz"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= FRAME_CACHE_MAX_BYTES:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+def log_background_failure(description: str) -> Callable[[asyncio.Future], None]:
+    """Done-callback for fire-and-forget futures: log a cancellation or exception"""
+    def callback(future: asyncio.Future) -> None:
+        if future.cancelled():
+            logger.warning(f"{description} was cancelled")
+        elif future.exception() is not None:
+            logger.error(f"{description} failed: {future.exception()}")
+    return callback
+
+async def cache_streamed_frames(frames: AsyncIterator[np.ndarray], cache_key: str,
+                                source_info: Dict[str, int]) -> AsyncIterator[np.ndarray]:
+    """Pass frames through unchanged and write them to the frame cache once the stream ends"""
+    collected = []
+    async for frame in frames:
+        collected.append(frame)
+        yield frame
+    # Write in the background; the pipeline does not need to wait for it, but
+    # shutdown does, and failures are logged rather than left on the future
+    write = asyncio.get_running_loop().run_in_executor(
+        decode_executor, store_cached_frames, cache_key, collected, source_info
+    )
+    pending_cache_writes.add(write)
+    write.add_done_callback(pending_cache_writes.discard)
+    write.add_done_callback(log_background_failure(f"Frame cache write {cache_key}"))
+
+def _warm_frame_cache_entry(video_path: str, num_frames: int) -> bool:
+    """Decode and cache one video; runs in a worker process"""
+    with open(video_path, "rb") as f:
+        cache_key = frame_cache_key(hashlib.blake2b(f.read()).hexdigest(), num_frames, MODEL_INPUT_SIZE)
+    if (FRAME_CACHE_DIR / f"{cache_key}.npz").exists():
+        return False
+    source_info: Dict[str, int] = {}
+    frames = list(iter_video_frames(video_path, num_frames, MODEL_INPUT_SIZE, source_info))
+    store_cached_frames(cache_key, frames, source_info)
+    return True
+
+def warm_frame_cache(video_paths: List[str], num_frames: int = 16, max_workers: Optional[int] = None) -> int:
+    """
+    Pre-populate the frame cache for a corpus of videos, decoding in parallel
+    worker processes. Returns the number of newly cached videos.
+    """
+    warmed = 0
+    # Spawned, not forked: the caller runs decode, model and OpenCV threads whose
+    # held locks a forked child would inherit
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(_warm_frame_cache_entry, path, num_frames): path for path in video_paths}
+        for future in as_completed(futures):
+            try:
+                warmed += future.result()
+            except Exception as e:
+                logger.warning(f"Failed to warm frame cache for {futures[future]}: {e}")
+    return warmed
+
+def warm_frame_cache_once(video_paths: List[str]) -> None:
+    """
+    Warm the frame cache from one process only: every uvicorn worker runs the
+    startup hook, so the first to take the lock does the decoding and the rest
+    skip it. The lock is released when its holder exits, even on a crash.
+    """
+    try:
+        FRAME_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(FRAME_CACHE_DIR / ".warm.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            warmed = warm_frame_cache(video_paths)
+            logger.info(f"Frame cache warmed with {warmed} of {len(video_paths)} videos")
+    except OSError as e:
+        logger.warning(f"Frame cache warming failed: {e}")
+
+async def run_yolo_stage(frame: np.ndarray) -> Dict[str, Any]:
+    """YOLO object detection (spatial analysis) on a single frame, micro-batched"""
+    yolo_detections = await yolo_batcher.submit(frame)
+    return yolo_detector.get_anomaly_summary(yolo_detections)
+
+def run_timesformer_stage(clip: np.ndarray, is_video: bool) -> Dict[str, Any]:
+    """TimeSformer temporal analysis over the sampled (T, H, W, 3) clip"""
+    if is_video and len(clip) > 1:
+        return timesformer_detector.detect_temporal_anomalies(clip)
+    # Single image analysis
+    return timesformer_detector.analyze_single_image(clip[0] if len(clip) else np.zeros((224, 224, 3)))
+
+async def collect_clip(frames: AsyncIterator[np.ndarray], num_frames: int,
+                       on_first_frame: Callable[[np.ndarray], None]) -> np.ndarray:
+    """
+    Gather streamed frames into one preallocated (T, H, W, 3) clip, calling
+    `on_first_frame` with the clip's first slot as soon as it is filled
+    """
+    clip = None
+    count = 0
+    async for frame in frames:
+        if clip is None:
+            clip = np.empty((num_frames, *frame.shape), dtype=frame.dtype)
+        clip[count] = frame
+        if count == 0:
+            on_first_frame(clip[0])
+        count += 1
+    if clip is None:
+        return np.empty((0, *MODEL_INPUT_SIZE[::-1], 3), dtype=np.uint8)
+    return clip[:count]
+
+async def process_multimodal_detection(frames: Union[np.ndarray, AsyncIterator[np.ndarray]], is_video: bool = True,
+                                       source_info: Optional[Dict[str, int]] = None,
+                                       num_frames: int = 16) -> Dict[str, Any]:
     """
     Enhanced multi-modal detection using YOLO + TimeSformer + Fusion
+
+    Runs as a pipeline: YOLO starts on the first frame while the rest are still
+    being decoded, TimeSformer starts once the clip is complete, and fusion
+    awaits both.
+
+    `frames` is either an already-decoded (T, H, W, 3) clip or a stream that is
+    gathered into one. Both stages get views of that single array: YOLO its
+    first frame, TimeSformer the whole clip, with no per-stage lists or stacking.
+
+    `source_info` carries the native resolution when frames were downscaled at
+    decode; it is filled in by the decoder, so it is read only after the stream
+    is drained. Resolution and bounding boxes are reported against it.
     """
     start_time = time.time()
+    loop = asyncio.get_running_loop()
     
     try:
-        # Step 1: YOLO Object Detection (spatial analysis)
-        yolo_result = {"anomaly_detected": False, "object_types": [], "max_confidence": 0.0, "highest_priority": "low"}
-        if frames:
-            yolo_detections = yolo_detector.detect_objects(frames[0])  # Use first frame for YOLO
-            yolo_result = yolo_detector.get_anomaly_summary(yolo_detections)
+        # Step 1: YOLO Object Detection on the first frame, overlapping decode
+        yolo_future = None
+        
+        def start_yolo(first_frame: np.ndarray) -> None:
+            nonlocal yolo_future
+            yolo_future = asyncio.ensure_future(run_yolo_stage(first_frame))
         
-        # Step 2: TimeSformer Temporal Analysis
-        if is_video and len(frames) > 1:
-            timesformer_result = timesformer_detector.detect_temporal_anomalies(frames)
+        if isinstance(frames, np.ndarray):
+            clip = frames
+            if len(clip):
+                start_yolo(clip[0])
         else:
-            # Single image analysis
-            timesformer_result = timesformer_detector.analyze_single_image(frames[0] if frames else np.zeros((224, 224, 3)))
+            clip = await collect_clip(frames, num_frames, start_yolo)
+        
+        if is_video:
+            logger.info(f"Extracted {len(clip)} frames from video")
+        
+        # Step 2: TimeSformer Temporal Analysis, concurrent with YOLO
+        timesformer_future = loop.run_in_executor(
+            timesformer_executor, run_timesformer_stage, clip, is_video
+        )
+        
+        yolo_result = {"anomaly_detected": False, "object_types": [], "max_confidence": 0.0, "highest_priority": "low"}
+        if yolo_future is not None:
+            yolo_result, timesformer_result = await asyncio.gather(yolo_future, timesformer_future)
+        else:
+            timesformer_result = await timesformer_future
         
         # Step 3: Fusion Engine combines both results
+        resolution = "unknown"
+        scale_x = scale_y = 1.0
+        if len(clip):
+            frame_h, frame_w = clip.shape[1:3]
+            source_w = source_info.get("width", frame_w) if source_info else frame_w
+            source_h = source_info.get("height", frame_h) if source_info else frame_h
+            resolution = f"{source_w}x{source_h}"
+            scale_x, scale_y = source_w / frame_w, source_h / frame_h
+        
         frame_metadata = {
-            "frame_count": len(frames),
-            "resolution": f"{frames[0].shape[1]}x{frames[0].shape[0]}" if frames else "unknown",
+            "frame_count": len(clip),
+            "resolution": resolution,
             "file_type": "video" if is_video else "image"
         }
         
         fused_result = fusion_engine.fuse_predictions(yolo_result, timesformer_result, frame_metadata)
         
-        # Add bounding boxes for frontend visualization
-        if frames and yolo_result.get("detections"):
-            fused_result["bounding_boxes"] = yolo_result["detections"]
+        # Add bounding boxes for frontend visualization, in source pixel coordinates
+        if len(clip) and yolo_result.get("detections") is not None:
+            detections = yolo_result["detections"]
+            if scale_x != 1.0 or scale_y != 1.0:
+                detections = detections.scaled(scale_x, scale_y)
+            fused_result["bounding_boxes"] = detections.to_list_of_dicts()
         
         return fused_result
         
@@ -209,14 +841,32 @@ def process_multimodal_detection(frames: List[np.ndarray], is_video: bool = True
 @app.on_event("startup")
 async def startup_event():
     """Initialize the enhanced AI service on startup"""
-    global start_time
+    global start_time, frame_cache_warmer
     start_time = time.time()
     logger.info("Starting Enhanced AI Microservice...")
     
     # Initialize all models on startup for faster inference
     initialize_models()
+    yolo_batcher.start()
+    
+    # Pre-decode configured videos in the background; requests are served meanwhile
+    if FRAME_CACHE_ENABLED and FRAME_CACHE_WARM_PATHS:
+        frame_cache_warmer = asyncio.get_running_loop().run_in_executor(
+            None, warm_frame_cache_once, FRAME_CACHE_WARM_PATHS
+        )
+        frame_cache_warmer.add_done_callback(log_background_failure("Frame cache warming"))
     logger.info("Enhanced AI Microservice ready")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the YOLO batcher, finish pending cache writes and release the pipeline worker threads"""
+    await yolo_batcher.stop()
+    if pending_cache_writes:
+        await asyncio.gather(*pending_cache_writes, return_exceptions=True)
+    decode_executor.shutdown(wait=False, cancel_futures=True)
+    yolo_executor.shutdown(wait=False, cancel_futures=True)
+    timesformer_executor.shutdown(wait=False, cancel_futures=True)
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Enhanced health check endpoint for multi-modal AI service"""
@@ -255,37 +905,44 @@ async def predict_anomaly(
                 detail=f"Unsupported file type: {file.content_type}. Only video and image files are supported."
             )
         
-        # Save uploaded file temporarily
-        file_suffix = Path(file.filename).suffix if file.filename else '.tmp'
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_suffix) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-        
-        try:
-            if is_video:
-                # Extract frames from video for multi-modal analysis
-                frames = timesformer_detector.extract_video_frames(tmp_file_path, max_frames=16)
-                logger.info(f"Extracted {len(frames)} frames from video")
-            else:
-                # Process single image
-                image = cv2.imread(tmp_file_path)
-                if image is None:
-                    raise ValueError("Could not read image file")
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                frames = [image_rgb]
-            
-            # Run enhanced multi-modal detection
-            result = process_multimodal_detection(frames, is_video)
-            
-            return PredictionResponse(**result)
+        if is_video:
+            # Video decoders need a path: copy the upload to a RAM-backed temp file
+            file_suffix = Path(file.filename).suffix if file.filename else '.tmp'
+            loop = asyncio.get_running_loop()
+            tmp_file_path, content_digest = await loop.run_in_executor(
+                decode_executor, save_upload_to_temp, file, file_suffix
+            )
             
-        finally:
-            # Clean up temporary file
             try:
-                os.unlink(tmp_file_path)
-            except OSError:
-                pass
+                cache_key = frame_cache_key(content_digest, 16, MODEL_INPUT_SIZE) if FRAME_CACHE_ENABLED else None
+                cached = load_cached_frames(cache_key) if cache_key else None
+                if cached is not None:
+                    logger.info("Frame cache hit")
+                    frames, source_info = cached
+                else:
+                    # Stream model-sized frames from video into the multi-modal pipeline
+                    source_info = {}
+                    frames = stream_video_frames(tmp_file_path, 16, MODEL_INPUT_SIZE, source_info)
+                    if cache_key:
+                        frames = cache_streamed_frames(frames, cache_key, source_info)
+                
+                # Run enhanced multi-modal detection
+                result = await process_multimodal_detection(frames, is_video, source_info)
+                
+            finally:
+                # Clean up temporary file
+                try:
+                    os.unlink(tmp_file_path)
+                except OSError:
+                    pass
+        else:
+            # Process single image straight from the upload bytes
+            image_rgb = decode_image(await file.read())
+            
+            # Run enhanced multi-modal detection
+            result = await process_multimodal_detection(image_rgb[np.newaxis], is_video)
+        
+        return PredictionResponse(**result)
     
     except HTTPException:
         raise
@@ -306,52 +963,28 @@ async def annotate_image(
         if not file.content_type or not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="Only image files are supported for annotation")
         
-        # Save uploaded file temporarily
-        file_suffix = Path(file.filename).suffix if file.filename else '.jpg'
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_suffix) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        start_time = time.time()
         
-        try:
-            start_time = time.time()
-            
-            # Read image
-            image = cv2.imread(tmp_file_path)
-            if image is None:
-                raise ValueError("Could not read image file")
-            
-            # Convert BGR to RGB for processing
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Run YOLO detection for objects to annotate
-            detections = yolo_detector.detect_objects(image_rgb)
-            
-            # Annotate image with red bounding boxes
-            annotated_image = yolo_detector.annotate_image(image_rgb, detections)
-            
-            # Convert back to BGR for encoding
-            annotated_bgr = cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR)
-            
-            # Encode to base64
-            _, buffer = cv2.imencode('.jpg', annotated_bgr)
-            img_b64 = base64.b64encode(buffer).decode('utf-8')
-            
-            processing_time = (time.time() - start_time) * 1000
-            
-            return AnnotatedImageResponse(
-                success=True,
-                image_b64=img_b64,
-                annotations_count=len([d for d in detections if d["is_anomaly"]]),
-                processing_time_ms=processing_time
-            )
-            
-        finally:
-            # Clean up temporary file
-            try:
-                os.unlink(tmp_file_path)
-            except OSError:
-                pass
+        # Decode straight from the upload bytes to RGB
+        image_rgb = decode_image(await file.read())
+        
+        # Run YOLO detection for objects to annotate
+        detections = await yolo_batcher.submit(image_rgb)
+        
+        # Annotate image with red bounding boxes
+        annotated_image = yolo_detector.annotate_image(image_rgb, detections)
+        
+        # Encode to base64
+        img_b64 = encode_jpeg_b64(annotated_image)
+        
+        processing_time = (time.time() - start_time) * 1000
+        
+        return AnnotatedImageResponse(
+            success=True,
+            image_b64=img_b64,
+            annotations_count=int(detections.is_anomaly.sum()),
+            processing_time_ms=processing_time
+        )
     
     except HTTPException:
         raise
@@ -373,5 +1006,7 @@ if __name__ == "__main__":
         host=host,
         port=port,
         reload=True,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
\ No newline at end of file
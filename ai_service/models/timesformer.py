@@ -10,18 +10,85 @@ import logging
 from typing import List, Dict, Tuple, Optional
 import time
 import tempfile
-import random
 from pathlib import Path
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # Fall back to the OpenCV reduction when Numba is unavailable
+    NUMBA_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+from .video import open_video_capture, sample_frame_indices
+from .weights import load_mmap_weights
+
 logger = logging.getLogger(__name__)
 
+# Shared generator for simulated confidences
+_rng = np.random.default_rng()
+
+# Motion heuristics only need a coarse scalar, which survives heavy decimation
+MOTION_ANALYSIS_SIZE = (160, 90)
+
+# Inter-frame differences at or below this level are treated as noise
+# (sensor grain, codec flicker) rather than movement
+MOTION_NOISE_THRESHOLD = 15
+
+# Activity cutoffs in three-frame motion units (mean above-noise change per
+# pixel). Only persistent movement counts, so these sit well below the levels
+# a plain frame difference reaches for the same scene
+MOTION_LOITERING_MAX = 0.2
+MOTION_SUSPICIOUS_MIN = 35
+MOTION_RUNNING_MIN = 50
+MOTION_FIGHTING_MIN = 60
+
+# Single-image edge density: the share of pixels whose Sobel L1 gradient
+# (Canny's own gradient) exceeds EDGE_GRADIENT_THRESHOLD. EDGE_THINNING stands
+# in for Canny's non-maximum suppression, chosen to keep the 0.15 activity
+# threshold in Canny-like units
+EDGE_GRADIENT_THRESHOLD = 100
+EDGE_THINNING = 0.5
+
+@njit(cache=True)
+def _three_frame_motion(stack, threshold):
+    """
+    Mean three-frame motion over each (k-2, k-1, k) window of a (T, H, W) uint8 stack
+
+    A pixel counts as moving only when both |F(k-2) - F(k-1)| and
+    |F(k-1) - F(k)| exceed the threshold; its contribution is the latter.
+    """
+    n_windows = stack.shape[0] - 2
+    height, width = stack.shape[1], stack.shape[2]
+    out = np.empty(n_windows, dtype=np.float64)
+    for t in range(n_windows):
+        acc = 0
+        for i in range(height):
+            for j in range(width):
+                d1 = abs(np.int32(stack[t + 1, i, j]) - np.int32(stack[t, i, j]))
+                d2 = abs(np.int32(stack[t + 2, i, j]) - np.int32(stack[t + 1, i, j]))
+                if d1 > threshold and d2 > threshold:
+                    acc += d2
+        out[t] = acc / (height * width)
+    return out
+
+def _empty_clip(channels_first: bool = False) -> np.ndarray:
+    """A zero-length clip for videos that yielded no frames"""
+    return np.empty((0, 3, 0, 0) if channels_first else (0, 0, 0, 3), dtype=np.uint8)
+
 class TimeSformerDetector:
     """TimeSformer-based temporal anomaly detector for surveillance"""
     
-    def __init__(self, model_name: str = "MCG-NJU/videomae-base"):
+    def __init__(self, model_name: str = "MCG-NJU/videomae-base", weights_path: Optional[str] = None):
         """Initialize TimeSformer detector"""
         self.model_name = model_name
+        self.weights_path = weights_path
         self.model = None
+        self.weights = None
+        self.precision = "fp16"
         self.feature_extractor = None
         self.confidence_threshold = 0.4
         
@@ -39,16 +106,27 @@ class TimeSformerDetector:
             "unusual_behavior": {"severity": "medium", "priority": "medium"}
         }
         
-    def load_model(self) -> bool:
+    def load_model(self, precision: str = "fp16") -> bool:
         """Load TimeSformer model and feature extractor (simulated for demo)"""
         try:
-            logger.info(f"Loading TimeSformer model: {self.model_name}")
+            logger.info(f"Loading TimeSformer model: {self.model_name} ({precision})")
+            
+            # Memory-mapped so worker processes share the weights' pages
+            self.weights = load_mmap_weights(self.weights_path)
+            self.precision = precision
             
             # Simulate model loading for demo
             self.feature_extractor = "simulated_feature_extractor"
             self.model = "simulated_timesformer_model"
             
-            logger.info("TimeSformer model loaded successfully (simulated)")
+            # In production, INT8 would dynamically quantize the linear layers
+            # (the bulk of the transformer's compute) and otherwise run FP16:
+            # if precision == "int8":
+            #     self.model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+            # else:
+            #     self.model = model.half()
+            
+            logger.info(f"TimeSformer model loaded successfully (simulated, {precision})")
             return True
             
         except Exception as e:
@@ -56,67 +134,86 @@ class TimeSformerDetector:
             logger.info("Using simulated TimeSformer detection")
             return True
             
-    def extract_video_frames(self, video_path: str, max_frames: int = 16) -> List[np.ndarray]:
+    def extract_video_frames(self, video_path: str, max_frames: int = 16,
+                             channels_first: bool = False) -> np.ndarray:
         """
         Extract frames from video for temporal analysis
         
+        Standalone helper for callers outside the service; /predict samples
+        frames through main.iter_video_frames instead.
+        
         Args:
             video_path: Path to video file
             max_frames: Maximum number of frames to extract
+            channels_first: Lay the clip out as (T, 3, H, W) instead of (T, H, W, 3)
             
         Returns:
-            List of video frames as numpy arrays
+            Video frames written once into a contiguous RGB clip, ready for a
+            single batched model call
         """
         try:
-            cap = cv2.VideoCapture(video_path)
-            frames = []
-            
-            # Get video properties
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
+            # FFmpeg backend with threaded decode; OpenCV defaults to one thread
+            cap = open_video_capture(video_path)
+            clip = None
+            count = 0
             
-            if total_frames <= max_frames:
-                # Extract all frames if video is short
-                frame_indices = list(range(total_frames))
-            else:
-                # Sample frames uniformly across video
-                frame_indices = np.linspace(0, total_frames - 1, max_frames, dtype=int)
-            
-            for frame_idx in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = cap.read()
-                if ret:
-                    # Convert BGR to RGB for model input
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frames.append(frame_rgb)
+            try:
+                # Every frame of a short video, otherwise uniformly across it
+                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                frame_indices = sample_frame_indices(total_frames, max_frames)
+                wanted = set(frame_indices.tolist())
+                
+                # One forward pass: grab() advances without decoding pixels and
+                # retrieve() only runs on sampled indices
+                for frame_idx in range(int(frame_indices[-1]) + 1 if len(frame_indices) else 0):
+                    if not cap.grab():
+                        break
+                    if frame_idx not in wanted:
+                        continue
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        continue
+                    if clip is None:
+                        clip = np.empty((len(wanted), *frame.shape), dtype=np.uint8)
+                    # Convert BGR to RGB for model input, straight into the clip
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=clip[count])
+                    count += 1
+            finally:
+                cap.release()
             
-            cap.release()
-            logger.info(f"Extracted {len(frames)} frames from video")
-            return frames
+            logger.info(f"Extracted {count} frames from video")
+            if clip is None:
+                return _empty_clip(channels_first)
+            clip = clip[:count]
+            return np.ascontiguousarray(clip.transpose(0, 3, 1, 2)) if channels_first else clip
             
         except Exception as e:
             logger.error(f"Failed to extract video frames: {e}")
-            return []
+            return _empty_clip(channels_first)
     
-    def detect_temporal_anomalies(self, frames: List[np.ndarray]) -> Dict:
+    def detect_temporal_anomalies(self, frames: np.ndarray, channels_first: bool = False) -> Dict:
         """
         Detect temporal anomalies in video sequence
         
         Args:
-            frames: List of video frames
+            frames: Video frames as a (T, H, W, 3) clip; a list of frames is
+                stacked once here
+            channels_first: The clip is laid out (T, 3, H, W)
             
         Returns:
             Detection results with anomaly classification
         """
-        if not frames:
+        if len(frames) == 0:
             return self._get_normal_result()
             
         try:
             start_time = time.time()
+            clip = frames if isinstance(frames, np.ndarray) else np.stack(frames)
             
             # For demonstration, we'll use simulated TimeSformer detection
-            # In production, this would use the actual model inference
-            result = self._simulate_timesformer_detection(frames)
+            # In production, this would be one batched forward pass over the clip:
+            # outputs = self.model(torch.from_numpy(clip).cuda(non_blocking=True))
+            result = self._simulate_timesformer_detection(clip, channels_first)
             
             processing_time = (time.time() - start_time) * 1000
             result["processing_time_ms"] = processing_time
@@ -128,7 +225,7 @@ class TimeSformerDetector:
             logger.error(f"TimeSformer detection failed: {e}")
             return self._get_normal_result()
     
-    def _simulate_timesformer_detection(self, frames: List[np.ndarray]) -> Dict:
+    def _simulate_timesformer_detection(self, frames: np.ndarray, channels_first: bool = False) -> Dict:
         """
         Simulate TimeSformer detection for demonstration
         In production, this would be replaced with actual model inference
@@ -139,21 +236,45 @@ class TimeSformerDetector:
         if num_frames == 0:
             return self._get_normal_result()
         
-        # Simple heuristics for simulation
-        frame_diffs = []
+        # Simple heuristics for simulation: three-frame differencing over
+        # downscaled grayscale frames, each frame converted once. Intersecting
+        # consecutive difference masks keeps pixels that keep moving and drops
+        # single-frame noise such as shadows and codec flicker
+        avg_motion = 0
         if num_frames > 1:
-            for i in range(1, min(num_frames, 5)):
-                diff = cv2.absdiff(
-                    cv2.cvtColor(frames[i-1], cv2.COLOR_RGB2GRAY),
-                    cv2.cvtColor(frames[i], cv2.COLOR_RGB2GRAY)
-                )
-                frame_diffs.append(np.mean(diff))
-        
-        avg_motion = np.mean(frame_diffs) if frame_diffs else 0
+            motion_frames = frames[:5]
+            gray = np.empty((len(motion_frames), MOTION_ANALYSIS_SIZE[1], MOTION_ANALYSIS_SIZE[0]), dtype=np.uint8)
+            for i, frame in enumerate(motion_frames):
+                if channels_first:
+                    frame = frame.transpose(1, 2, 0)
+                small = cv2.resize(frame, MOTION_ANALYSIS_SIZE, interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(small, cv2.COLOR_RGB2GRAY, dst=gray[i])
+            
+            if num_frames == 2:
+                # A single pair has no window to intersect; drop its noise the
+                # same way, so it stays on the three-frame scale
+                diff = cv2.absdiff(gray[0], gray[1])
+                moving = cv2.threshold(diff, MOTION_NOISE_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+                avg_motion = float(cv2.bitwise_and(diff, moving).sum(dtype=np.int64)) / diff.size
+            elif NUMBA_AVAILABLE:
+                # Compiled per-window reduction
+                avg_motion = float(_three_frame_motion(gray, MOTION_NOISE_THRESHOLD).mean())
+            else:
+                # Each window's D1 is the previous window's D2, so every
+                # consecutive difference is computed and thresholded once;
+                # all windows have the same pixel count, so the mean of
+                # per-window means is the overall mean
+                rows = (gray.shape[0] - 1) * gray.shape[1]
+                diffs = cv2.absdiff(gray[1:].reshape(rows, -1), gray[:-1].reshape(rows, -1))
+                moving = cv2.threshold(diffs, MOTION_NOISE_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+                split = gray.shape[1]
+                moving = cv2.bitwise_and(moving[:-split], moving[split:])
+                motion = cv2.bitwise_and(diffs[split:], moving)
+                avg_motion = float(motion.sum(dtype=np.int64)) / motion.size
         
         # Simulate different anomaly types based on motion analysis
-        if avg_motion > 50:
-            if avg_motion > 80:
+        if avg_motion > MOTION_SUSPICIOUS_MIN:
+            if avg_motion > MOTION_FIGHTING_MIN:
                 return {
                     "anomaly_detected": True,
                     "anomaly_type": "fighting",
@@ -167,7 +288,7 @@ class TimeSformerDetector:
                         "activity_level": "high"
                     }
                 }
-            elif avg_motion > 65:
+            elif avg_motion > MOTION_RUNNING_MIN:
                 return {
                     "anomaly_detected": True,
                     "anomaly_type": "running",
@@ -196,7 +317,7 @@ class TimeSformerDetector:
                     }
                 }
         else:
-            if avg_motion < 5:
+            if avg_motion < MOTION_LOITERING_MAX:
                 return {
                     "anomaly_detected": True,
                     "anomaly_type": "loitering",
@@ -218,7 +339,7 @@ class TimeSformerDetector:
         return {
             "anomaly_detected": False,
             "anomaly_type": "normal",
-            "confidence": 0.2 + np.random.random() * 0.3,  # 0.2-0.5 range
+            "confidence": 0.2 + _rng.random() * 0.3,  # 0.2-0.5 range
             "severity": "none",
             "priority": "low",
             "description": "Normal activity detected",
@@ -245,13 +366,18 @@ class TimeSformerDetector:
         # Convert to grayscale for analysis
         gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
         
-        # Simple edge detection for activity level
-        edges = cv2.Canny(gray, 50, 150)
-        edge_density = np.mean(edges) / 255.0
+        # Edge density for activity level: strong-gradient pixel share in
+        # Canny-like units, without Canny's NMS and hysteresis passes.
+        # Saturating |gx| and |gy| to uint8 cannot flip a comparison against 100
+        grad = cv2.add(cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3)),
+                       cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3)))
+        strong = cv2.threshold(grad, EDGE_GRADIENT_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+        edge_density = EDGE_THINNING * cv2.countNonZero(strong) / strong.size
         
-        # Brightness and contrast analysis
-        brightness = np.mean(gray) / 255.0
-        contrast = np.std(gray) / 255.0
+        # Brightness and contrast analysis in a single pass over the image
+        mean, stddev = cv2.meanStdDev(gray)
+        brightness = float(mean[0, 0]) / 255.0
+        contrast = float(stddev[0, 0]) / 255.0
         
         # Simulate temporal analysis for single frame
         if edge_density > 0.15:  # High detail/activity
@@ -274,7 +400,7 @@ class TimeSformerDetector:
             return {
                 "anomaly_detected": False,
                 "anomaly_type": "normal",
-                "confidence": 0.2 + np.random.random() * 0.2,
+                "confidence": 0.2 + _rng.random() * 0.2,
                 "severity": "none",
                 "priority": "low",
                 "description": "Normal activity level in image",
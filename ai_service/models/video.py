@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Video Decoding Helpers
+Shared by the service's frame sampler and the TimeSformer detector
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+# Threads this process may spend on decode and per-frame OpenCV work. The
+# launcher divides the cores between uvicorn workers through AI_WORKER_THREADS;
+# a single process gets them all
+WORKER_THREADS = int(os.getenv("AI_WORKER_THREADS", "0")) or os.cpu_count() or 1
+
+# OpenCV's own parallel loops (resize, color conversion) follow the same budget
+cv2.setNumThreads(WORKER_THREADS)
+
+def open_video_capture(video_path: str) -> cv2.VideoCapture:
+    """
+    Open a capture on the FFmpeg backend with libavcodec threading enabled
+    (OpenCV otherwise decodes on a single thread), falling back to whichever
+    backend OpenCV picks
+    """
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_N_THREADS, WORKER_THREADS])
+    if not cap.isOpened():
+        cap = cv2.VideoCapture(video_path)
+    return cap
+
+def sample_frame_indices(total_frames: int, num_frames: int) -> np.ndarray:
+    """
+    Indices of `num_frames` frames spread evenly across a video; a video with
+    no more frames than that is sampled whole, each frame once
+    """
+    if total_frames <= num_frames:
+        return np.arange(max(total_frames, 0))
+    return np.linspace(0, total_frames - 1, num_frames, dtype=int)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Model Weight Loading
+Memory-maps checkpoint tensors so worker processes share one copy of the weights
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def load_mmap_weights(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Load a checkpoint with its tensor storage memory-mapped from disk
+
+    The read-only pages live in the kernel page cache, so every worker process
+    serving the model maps the same physical memory instead of holding a private
+    copy. weights_only restricts unpickling to tensors and plain containers.
+
+    Returns None when torch or the file is unavailable, or the checkpoint cannot
+    be loaded this way (e.g. a pickled full model rather than a state dict).
+    """
+    if not path or not Path(path).is_file():
+        return None
+    try:
+        # Optional, and imported only when there is a checkpoint to load, so
+        # workers serving the simulated detectors never pay for torch
+        import torch
+    except ImportError:
+        return None
+    try:
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except Exception as e:
+        logger.warning(f"Could not memory-map weights from {path}: {e}")
+        return None
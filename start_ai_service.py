@@ -5,7 +5,6 @@ Script to start the AI microservice on Replit
 
 import os
 import sys
-import subprocess
 
 def main():
     # Set environment variables
@@ -18,24 +17,39 @@ def main():
     print(f"Health check: http://localhost:8001/health")
     print(f"API Docs: http://localhost:8001/docs")
     
-    # Change to ai_service directory
-    ai_service_dir = os.path.join(os.path.dirname(__file__), 'ai_service')
-    os.chdir(ai_service_dir)
+    ai_service_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_service')
+    reload = os.getenv('AI_SERVICE_RELOAD', '0') == '1'
+    # One worker process per core: inference releases the GIL, but request
+    # handling and fusion do not. Reload mode always runs a single worker.
+    workers = 1 if reload else int(os.getenv('AI_SERVICE_WORKERS', str(os.cpu_count() or 1)))
+    # Split the cores between workers for each one's decode and OpenCV thread
+    # pools, instead of every worker sizing its pools to the whole machine
+    if workers > 1:
+        os.environ.setdefault('AI_WORKER_THREADS', str(max(1, (os.cpu_count() or 1) // workers)))
+    
+    # Start the FastAPI service in this process; app_dir puts ai_service on
+    # sys.path instead of changing the working directory. Auto-reload is
+    # opt-in since it adds a watcher process on top of the server.
+    # The launcher itself never imports the app: each worker imports main
+    # (and with it cv2, numpy and the models) on its own, so only the server
+    # is loaded here, and only once we are actually starting it.
+    import uvicorn
     
-    # Start the FastAPI service
     try:
-        subprocess.run([
-            sys.executable, '-m', 'uvicorn', 
+        uvicorn.run(
             'main:app',
-            '--host', '0.0.0.0',
-            '--port', '8001',
-            '--reload'
-        ], check=True)
+            host='0.0.0.0',
+            port=8001,
+            workers=workers,
+            loop='uvloop',
+            http='httptools',
+            log_level=os.getenv('AI_SERVICE_LOG_LEVEL', 'warning'),
+            reload=reload,
+            reload_dirs=[ai_service_dir] if reload else None,
+            app_dir=ai_service_dir
+        )
     except KeyboardInterrupt:
         print("\nAI Service stopped by user")
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to start AI service: {e}")
-        return 1
     
     return 0
 